@@ -1,7 +1,28 @@
 import os
 import datetime as dt
 import azure.functions as func
-from fetch_fuel_rates import main as fetch_main
+import pyodbc
+from .fetch_fuel_rates import connect, main as fetch_main
+
+# The Functions worker process is reused across timer firings, so keep one
+# connection alive at module scope instead of reconnecting every tick
+# (repeated opens against Azure SQL also burn through its connection limit)
+_CNXN = None
+
+def _get_cursor():
+    global _CNXN
+    if _CNXN is not None:
+        try:
+            # Cursor allocation is local, so round-trip a SELECT 1 to prove
+            # the connection is still alive before handing it out
+            cursor = _CNXN.cursor()
+            cursor.execute("SELECT 1").fetchone()
+            return cursor
+        except pyodbc.Error:
+            # Server dropped the idle connection; reconnect below
+            _CNXN = None
+    _CNXN = connect()
+    return _CNXN.cursor()
 
 def get_prev_week_and_month():
     today = dt.date.today()
@@ -25,10 +46,23 @@ def main(timer: func.TimerRequest) -> None:
         fetch_main(override, dry_run=True)
         return
 
-    # Normal scheduled run: fetch just last week and last month
+    # Normal scheduled run: fetch just last week and last month on the
+    # long-lived connection; the worker recycle closes it eventually
     weekly_start, monthly_start = get_prev_week_and_month()
-    fetch_main(weekly_start, dry_run=False)
-    fetch_main(monthly_start, dry_run=False)
+    global _CNXN
+    cursor = _get_cursor()
+    try:
+        fetch_main(weekly_start, cursor=cursor, incremental=True)
+        fetch_main(monthly_start, cursor=cursor, incremental=True)
+    except pyodbc.Error:
+        # Don't hand a poisoned connection to the next tick
+        _CNXN = None
+        raise
+    finally:
+        try:
+            cursor.close()
+        except pyodbc.Error:
+            pass  # closing a cursor on a dead connection is best-effort
 
 # To test locally with an override:
 #   Set environment variable START_DATE_OVERRIDE to "2024-01-01"